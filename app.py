@@ -1,22 +1,281 @@
-from flask import Flask, request, redirect, session, render_template_string
-import sqlite3, os, shutil
-from datetime import datetime
+from flask import Flask, Response, request, redirect, session, stream_with_context, jsonify, g
+import sqlite3, os, re, io, csv, json, math, time, queue, threading, atexit, functools, hashlib, gzip, click
+from concurrent.futures import Future
+from contextlib import closing
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev server, no lock needed
+    fcntl = None
 
 # ---------------- CONFIG ----------------
 app = Flask(__name__)
 app.secret_key = "SMART-TAILOR-SECRET"
 
-DB_FILE = "data.db"
+DB_FILE = os.environ.get("DB_FILE", "data.db")
 ADMIN_PASSWORD = "admin123"
+# Customers saved before rows were scoped per license belong to this shop. If
+# unset they stay unassigned (visible to no one) until `flask assign-customers`.
+LEGACY_LICENSE = os.environ.get("LEGACY_LICENSE")
+
+# SQLite tuning, applied to every pooled connection
+DB_BUSY_TIMEOUT = int(os.environ.get("DB_BUSY_TIMEOUT", 5000))  # ms
+DB_SYNCHRONOUS = os.environ.get("DB_SYNCHRONOUS", "NORMAL")  # safe with WAL
+DB_MMAP_SIZE = int(os.environ.get("DB_MMAP_SIZE", 256 * 1024 * 1024))
+DB_CACHE_SIZE = int(os.environ.get("DB_CACHE_SIZE", -16000))  # negative = KiB
+DB_RETRIES = int(os.environ.get("DB_RETRIES", 5))
+
+VIEW_PAGE_SIZE = int(os.environ.get("VIEW_PAGE_SIZE", 50))
+VIEW_MAX_PAGE_SIZE = 500
+STREAM_CHUNK = 500  # rows fetched per chunk by /view?all=1
+SEARCH_LIMIT = int(os.environ.get("SEARCH_LIMIT", 50))
+
+LICENSE_CACHE_TTL = int(os.environ.get("LICENSE_CACHE_TTL", 60))  # seconds
+LICENSE_CACHE_MAX = 10000
+LOGIN_FLUSH_INTERVAL = int(os.environ.get("LOGIN_FLUSH_INTERVAL", 5))  # seconds
+
+# Group commit for /add: rows that arrive while a commit is running are committed
+# together. Batching needs concurrent requests in one process, i.e. gunicorn's
+# gthread workers (see gunicorn.conf.py); sync workers only ever batch one row.
+WRITE_BATCH_WINDOW = int(os.environ.get("WRITE_BATCH_WINDOW_MS", 3)) / 1000
+WRITE_BATCH_MAX = int(os.environ.get("WRITE_BATCH_MAX", 200))
+WRITE_ACK_TIMEOUT = 30  # seconds a request waits for its row to be committed
+
+IMPORT_CHUNK = int(os.environ.get("IMPORT_CHUNK", 1000))  # rows per transaction
+IMPORT_MAX_ERRORS = 20  # rejected line numbers reported back
+
+BACKUP_DIR = os.environ.get("BACKUP_DIR", "backup")
+BACKUP_INTERVAL = int(os.environ.get("BACKUP_INTERVAL", 300))  # seconds between snapshots
+# Retention: newest snapshot per hour/day/week is kept for this many buckets
+BACKUP_KEEP_HOURLY = int(os.environ.get("BACKUP_KEEP_HOURLY", 24))
+BACKUP_KEEP_DAILY = int(os.environ.get("BACKUP_KEEP_DAILY", 7))
+BACKUP_KEEP_WEEKLY = int(os.environ.get("BACKUP_KEEP_WEEKLY", 8))
+
+# ---------------- METRICS ----------------
+# Request latency and SQLite usage, exposed in Prometheus text format at
+# /metrics. Values are per process: scrape each gunicorn worker, or sum them.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+_metrics_lock = threading.Lock()
+_counters = {}  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [per-bucket counts..., sum, count]
+_histogram_buckets = {}  # name -> bucket upper bounds
+_request_stats = threading.local()
+
+def inc(name, amount=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        _histogram_buckets.setdefault(name, buckets)
+        h = _histograms.setdefault(key, [0] * (len(buckets) + 2))
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                h[i] += 1
+        h[-2] += value
+        h[-1] += 1
+
+def _labels(pairs):
+    return ",".join(f'{k}="{v}"' for k, v in pairs)
+
+def render_metrics():
+    # The pid tells scrapers which gunicorn worker answered
+    lines = ["# TYPE smarttailor_process_pid gauge", f"smarttailor_process_pid {os.getpid()}"]
+    with _metrics_lock:
+        for name in sorted({n for n, _ in _counters}):
+            if name in METRIC_HELP:
+                lines.append(f"# HELP {name} {METRIC_HELP[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for (n, labels), value in sorted(_counters.items()):
+                if n == name:
+                    lines.append(f"{name}{{{_labels(labels)}}} {value}" if labels else f"{name} {value}")
+        for name in sorted(_histogram_buckets):
+            if name in METRIC_HELP:
+                lines.append(f"# HELP {name} {METRIC_HELP[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for (n, labels), h in sorted(_histograms.items()):
+                if n != name:
+                    continue
+                for bound, count in zip(_histogram_buckets[name], h):
+                    lines.append(f'{name}_bucket{{{_labels(labels + (("le", bound),))}}} {count}')
+                lines.append(f'{name}_bucket{{{_labels(labels + (("le", "+Inf"),))}}} {h[-1]}')
+                lines.append(f"{name}_sum{{{_labels(labels)}}} {h[-2]}")
+                lines.append(f"{name}_count{{{_labels(labels)}}} {h[-1]}")
+    return "\n".join(lines) + "\n"
+
+METRIC_HELP = {
+    "smarttailor_db_query_seconds_total": "Time in SQLite, covering executing statements, fetching their rows and committing.",
+    "smarttailor_db_lock_wait_seconds_total": "Lock waits that ended in 'database is locked', plus retry backoff. "
+                                              "Waits that busy_timeout resolves successfully are not visible to the app "
+                                              "and are only included in query time.",
+    "smarttailor_request_db_seconds": "SQLite time per request, including fetches and commits. Streamed responses are cut off at the first byte. "
+                                      "/add is charged the whole group commit its row was part of.",
+    "smarttailor_write_ack_wait_seconds": "Time /add waited for the writer thread to commit its row.",
+    "smarttailor_request_duration_seconds": "Request latency. Streamed responses (/view?all=1, /export) are timed to their first byte.",
+}
+
+def record_db_time(seconds):
+    inc("smarttailor_db_query_seconds_total", seconds)
+    _request_stats.seconds = getattr(_request_stats, "seconds", 0.0) + seconds
+
+def record_query(seconds, locked=False):
+    inc("smarttailor_db_queries_total")
+    if locked:
+        inc("smarttailor_db_lock_errors_total")
+        inc("smarttailor_db_lock_wait_seconds_total", seconds)
+    _request_stats.queries = getattr(_request_stats, "queries", 0) + 1
+    record_db_time(seconds)
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Times row fetches; for SELECTs most of SQLite's work happens here."""
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            record_db_time(time.perf_counter() - start)
+
+    def fetchone(self):
+        return self._timed(super().fetchone)
+
+    def fetchmany(self, *args):
+        return self._timed(super().fetchmany, *args)
+
+    def fetchall(self):
+        return self._timed(super().fetchall)
+
+    def __next__(self):
+        return self._timed(super().__next__)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Times every execute/executemany, the fetches on the cursor they return,
+    and commits. A statement that fails with 'database is locked' spent its
+    whole duration waiting on busy_timeout."""
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            result = method(*args)
+        except sqlite3.OperationalError as e:
+            record_query(time.perf_counter() - start, locked="locked" in str(e) or "busy" in str(e))
+            raise
+        record_query(time.perf_counter() - start)
+        return result
+
+    # sqlite3.Connection.execute ignores cursor subclasses, so go through one
+    def execute(self, *args):
+        return self._timed(self.cursor(InstrumentedCursor).execute, *args)
+
+    def executemany(self, *args):
+        return self._timed(self.cursor(InstrumentedCursor).executemany, *args)
+
+    # A commit is where the fsync happens; it is SQLite time but not a query
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            record_db_time(time.perf_counter() - start)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    _request_stats.queries = 0
+    _request_stats.seconds = 0.0
+
+# Streamed responses (/view?all=1, /export) are timed to their first byte
+@app.after_request
+def record_request(resp):
+    endpoint = request.endpoint or "unmatched"
+    observe("smarttailor_request_duration_seconds", time.perf_counter() - g.request_start,
+            endpoint=endpoint, method=request.method)
+    observe("smarttailor_request_queries", _request_stats.queries, QUERY_COUNT_BUCKETS, endpoint=endpoint)
+    observe("smarttailor_request_db_seconds", _request_stats.seconds, endpoint=endpoint)
+    inc("smarttailor_requests_total", endpoint=endpoint, status=resp.status_code)
+    return resp
+
+@app.route("/metrics")
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
 
 # ---------------- DATABASE ----------------
-def get_db():
-    conn = sqlite3.connect(DB_FILE)
+# Each thread of each gunicorn worker keeps one connection open and reuses it
+# for every request it serves. WAL lets /view and /search read while /add writes.
+_local = threading.local()
+
+def connect_db():
+    conn = sqlite3.connect(DB_FILE, timeout=DB_BUSY_TIMEOUT / 1000, factory=InstrumentedConnection)
+    inc("smarttailor_db_connections_opened_total")
     conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT}")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size={DB_CACHE_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
     return conn
 
+def get_db():
+    conn = getattr(_local, "conn", None)
+    # A connection must never be shared across a fork
+    if conn is None or _local.pid != os.getpid():
+        conn = _local.conn = connect_db()
+        _local.pid = os.getpid()
+    return conn
+
+@app.teardown_appcontext
+def release_db(exc):
+    # Keep the connection open, but never leak a transaction into the next request
+    conn = getattr(_local, "conn", None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+def retry_on_busy(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        for attempt in range(DB_RETRIES):
+            try:
+                return fn(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                busy = "locked" in str(e) or "busy" in str(e)
+                if not busy or attempt == DB_RETRIES - 1:
+                    raise
+                get_db().rollback()
+                delay = 0.05 * 2 ** attempt
+                inc("smarttailor_db_lock_retries_total")
+                inc("smarttailor_db_lock_wait_seconds_total", delay)
+                time.sleep(delay)
+    return wrapper
+
+@contextmanager
+def migration_lock():
+    # busy_timeout gives up after DB_BUSY_TIMEOUT; flock waits for as long as
+    # another process needs to finish migrating
+    with open(f"{DB_FILE}.migrate.lock", "w") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
 def init_db():
-    conn = get_db()
+    with migration_lock():
+        _init_db()
+
+def _init_db():
+    # Runs at import, possibly before gunicorn forks: use a private connection
+    conn = connect_db()
     cur = conn.cursor()
     # Customers
     cur.execute("""
@@ -53,55 +312,542 @@ def init_db():
     )
     """)
     conn.commit()
+    migrate_db(conn)
     conn.close()
 
+# ---------------- MIGRATIONS ----------------
+# Each step runs once per database; progress is tracked in PRAGMA user_version.
+# A released step must never change, so each one spells out its own SQL rather
+# than reading module-level lists that later steps might extend.
+# gunicorn.conf.py runs `flask migrate` before any worker boots, so workers only
+# find the schema current. Any other process that imports the app at the same
+# time waits on migration_lock() and then sees the bumped version.
+def migrate_db(conn):
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= len(MIGRATIONS):
+            conn.rollback()
+            return
+        MIGRATIONS[version](conn)
+        conn.execute(f"PRAGMA user_version={version + 1}")
+        conn.commit()
+
+def digits(value):
+    return re.sub(r"\D", "", value or "")
+
+def migrate_search_index(conn):
+    cols = [r["name"] for r in conn.execute("PRAGMA table_info(customers)")]
+    if "mobile_digits" not in cols:
+        conn.execute("ALTER TABLE customers ADD COLUMN mobile_digits TEXT")
+    rows = conn.execute("SELECT id, mobile FROM customers").fetchall()
+    conn.executemany("UPDATE customers SET mobile_digits=? WHERE id=?", ((digits(r["mobile"]), r["id"]) for r in rows))
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_mobile_digits ON customers(mobile_digits)")
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5(name, mobile_digits, tokenize='trigram')")
+    conn.execute("DELETE FROM customers_fts")
+    conn.execute("INSERT INTO customers_fts(rowid, name, mobile_digits) SELECT id, name, mobile_digits FROM customers")
+    # Keep the trigram index in step with customers whatever writes the row
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS customers_fts_ai AFTER INSERT ON customers BEGIN
+        INSERT INTO customers_fts(rowid, name, mobile_digits) VALUES (new.id, new.name, new.mobile_digits);
+    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS customers_fts_ad AFTER DELETE ON customers BEGIN
+        DELETE FROM customers_fts WHERE rowid=old.id;
+    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS customers_fts_au AFTER UPDATE OF name, mobile_digits ON customers BEGIN
+        UPDATE customers_fts SET name=new.name, mobile_digits=new.mobile_digits WHERE rowid=new.id;
+    END""")
+
+def migrate_customer_license(conn):
+    cols = [r["name"] for r in conn.execute("PRAGMA table_info(customers)")]
+    if "license" not in cols:
+        conn.execute("ALTER TABLE customers ADD COLUMN license TEXT")
+    if LEGACY_LICENSE:
+        conn.execute("UPDATE customers SET license=? WHERE license IS NULL", (LEGACY_LICENSE,))
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_license_id ON customers(license, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_license_mobile ON customers(license, mobile_digits)")
+    conn.execute("DROP INDEX IF EXISTS idx_customers_mobile_digits")
+
+# Measurements and amount are REAL; a value that is not a number (e.g. "40 1/2")
+# is still stored as typed, thanks to SQLite's column affinity. created_at stays
+# ISO-8601 text, which SQLite's date functions read and which sorts by time.
+NUMERIC_COLUMNS = ["length", "chest", "waist", "shalwar_length", "cuff", "ghara", "poncha", "collar", "amount"]
+
+# Amounts are typed as "1,200", "Rs 1500" or "Rs. 1,500/-"
+CURRENCY_NOISE = re.compile(r"(?i)^\s*(?:rs|pkr)\.?|(?:rs|pkr)\.?\s*$|₨|/-|,")
+
+def parse_number(value):
+    try:
+        return float(CURRENCY_NOISE.sub("", value or "").strip())
+    except ValueError:
+        return None
+
+def numeric(value):
+    value = (value or "").strip()
+    if not value:
+        return None
+    number = parse_number(value)
+    # float() also takes "inf", "nan" and "1e999", which would poison the rollups
+    return number if number is not None and math.isfinite(number) else value
+
+def migrate_typed_customers(conn):
+    conn.execute("""
+    CREATE TABLE customers_typed(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        license TEXT,
+        name TEXT,
+        mobile TEXT,
+        mobile_digits TEXT,
+        length REAL,
+        chest REAL,
+        waist REAL,
+        shalwar_length REAL,
+        cuff REAL,
+        side TEXT,
+        packet TEXT,
+        shalwar_packet TEXT,
+        zip TEXT,
+        ghara REAL,
+        slai TEXT,
+        button_style TEXT,
+        poncha REAL,
+        collar REAL,
+        amount REAL,
+        created_at TEXT
+    )
+    """)
+    # Columns from older schemas (e.g. shoulder, batton in old snapshots) are
+    # carried over as they are rather than dropped with the old table
+    old = {r["name"]: r["type"] for r in conn.execute("PRAGMA table_info(customers)")}
+    new = {r["name"]: r["type"] for r in conn.execute("PRAGMA table_info(customers_typed)")}
+    for name, type_ in old.items():
+        if name not in new:
+            conn.execute(f'ALTER TABLE customers_typed ADD COLUMN "{name}" {type_}')
+    cols = [f'"{c}"' for c in old]
+    exprs = [f"NULLIF(TRIM({c}),'')" if new.get(c) == "REAL" else f'"{c}"' for c in old]
+    conn.execute(f"INSERT INTO customers_typed ({','.join(cols)}) SELECT {','.join(exprs)} FROM customers")
+    seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='customers'").fetchone()
+    conn.execute("DROP TABLE customers")
+    conn.execute("ALTER TABLE customers_typed RENAME TO customers")
+    if seq:
+        conn.execute("UPDATE sqlite_sequence SET seq=max(seq, ?) WHERE name='customers'", (seq[0],))
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_license_id ON customers(license, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_license_mobile ON customers(license, mobile_digits)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_license_created ON customers(license, created_at)")
+    # Dropping the old table dropped its search triggers
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS customers_fts_ai AFTER INSERT ON customers BEGIN
+        INSERT INTO customers_fts(rowid, name, mobile_digits) VALUES (new.id, new.name, new.mobile_digits);
+    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS customers_fts_ad AFTER DELETE ON customers BEGIN
+        DELETE FROM customers_fts WHERE rowid=old.id;
+    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS customers_fts_au AFTER UPDATE OF name, mobile_digits ON customers BEGIN
+        UPDATE customers_fts SET name=new.name, mobile_digits=new.mobile_digits WHERE rowid=new.id;
+    END""")
+
+# Per-license order count and revenue by day and by month, maintained by
+# triggers so reports never scan customers.
+def migrate_rollups(conn):
+    revenue = "CASE WHEN typeof({0}.amount) IN ('integer','real') THEN {0}.amount ELSE 0 END"
+
+    def rollup_sql(row, sign):
+        sql = []
+        for table, key, width in (("daily_rollups", "day", 10), ("monthly_rollups", "month", 7)):
+            sql.append(f"""INSERT INTO {table}(license, {key}, orders, revenue)
+            VALUES ({row}.license, substr({row}.created_at,1,{width}), {sign}1, {sign}{revenue.format(row)})
+            ON CONFLICT(license, {key}) DO UPDATE SET orders=orders+excluded.orders, revenue=revenue+excluded.revenue;""")
+        return "\n            ".join(sql)
+
+    for table, key, width in (("daily_rollups", "day", 10), ("monthly_rollups", "month", 7)):
+        conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table}(
+            license TEXT NOT NULL,
+            {key} TEXT NOT NULL,
+            orders INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY(license, {key})
+        ) WITHOUT ROWID
+        """)
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"""
+        INSERT INTO {table}(license, {key}, orders, revenue)
+        SELECT license, substr(created_at,1,{width}), count(*), total({revenue.format("customers")})
+        FROM customers WHERE license IS NOT NULL AND created_at IS NOT NULL GROUP BY 1, 2
+        """)
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS customers_rollup_ai AFTER INSERT ON customers
+        WHEN new.license IS NOT NULL AND new.created_at IS NOT NULL BEGIN
+            {rollup_sql("new", "")}
+        END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS customers_rollup_ad AFTER DELETE ON customers
+        WHEN old.license IS NOT NULL AND old.created_at IS NOT NULL BEGIN
+            {rollup_sql("old", "-")}
+        END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS customers_rollup_au_old AFTER UPDATE OF license, amount, created_at ON customers
+        WHEN old.license IS NOT NULL AND old.created_at IS NOT NULL BEGIN
+            {rollup_sql("old", "-")}
+        END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS customers_rollup_au_new AFTER UPDATE OF license, amount, created_at ON customers
+        WHEN new.license IS NOT NULL AND new.created_at IS NOT NULL BEGIN
+            {rollup_sql("new", "")}
+        END""")
+
+# Lets the short-query search fallback use a range scan on name prefixes
+def migrate_name_prefix_index(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_license_name ON customers(license, name COLLATE NOCASE)")
+
+# Re-parse numbers that the typed migration had to keep as text, e.g. "1,200"
+def migrate_normalize_numbers(conn):
+    conn.create_function("numeric", 1, numeric, deterministic=True)
+    for col in ["length", "chest", "waist", "shalwar_length", "cuff", "ghara", "poncha", "collar", "amount"]:
+        conn.execute(f"UPDATE customers SET {col}=numeric({col}) WHERE typeof({col})='text'")
+
+# Amounts like "1e999" were stored as inf, which no later order can cancel out
+# of a rollup. Keep them as text like other values that are not numbers, and
+# recompute the rollups from scratch.
+def migrate_finite_numbers(conn):
+    infinite = "typeof({0})='real' AND abs({0})>1.7976931348623157e308"
+    if conn.execute(f"SELECT 1 FROM customers WHERE {infinite.format('amount')} LIMIT 1").fetchone():
+        # inf - inf is NULL, which the rollups' NOT NULL revenue would reject
+        conn.execute("DELETE FROM daily_rollups")
+        conn.execute("DELETE FROM monthly_rollups")
+    for col in ["length", "chest", "waist", "shalwar_length", "cuff", "ghara", "poncha", "collar", "amount"]:
+        conn.execute(f"UPDATE customers SET {col}=CASE WHEN {col}>0 THEN 'inf' ELSE '-inf' END WHERE {infinite.format(col)}")
+    for table, key, width in (("daily_rollups", "day", 10), ("monthly_rollups", "month", 7)):
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"""
+        INSERT INTO {table}(license, {key}, orders, revenue)
+        SELECT license, substr(created_at,1,{width}), count(*),
+               total(CASE WHEN typeof(amount) IN ('integer','real') THEN amount ELSE 0 END)
+        FROM customers WHERE license IS NOT NULL AND created_at IS NOT NULL GROUP BY 1, 2
+        """)
+
+MIGRATIONS = [
+    migrate_search_index,
+    migrate_customer_license,
+    migrate_typed_customers,
+    migrate_rollups,
+    migrate_name_prefix_index,
+    migrate_normalize_numbers,
+    migrate_finite_numbers,
+]
+
 init_db()
 
+@app.cli.command("migrate")
+def migrate_command():
+    """Bring the database schema up to date (also done at import)."""
+    init_db()
+    version = get_db().execute("PRAGMA user_version").fetchone()[0]
+    click.echo(f"{DB_FILE} is at schema version {version}")
+
+# ---------------- BACKGROUND WORKERS ----------------
+# Workers start lazily on first use, once per process: threads do not survive
+# a gunicorn fork, so a worker started in another pid is started again.
+_workers = {}
+_workers_lock = threading.Lock()
+
+def ensure_worker(name, target):
+    with _workers_lock:
+        pid, thread = _workers.get(name, (None, None))
+        if pid != os.getpid() or not thread.is_alive():
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            _workers[name] = (os.getpid(), thread)
+
 # ---------------- BACKUP ----------------
-def backup_db():
-    if not os.path.exists("backup"):
-        os.mkdir("backup")
-    shutil.copy(DB_FILE, f"backup/data_{datetime.now().strftime('%Y%m%d_%H%M')}.db")
+# Writers only mark the database dirty; a background worker takes at most one
+# snapshot per BACKUP_INTERVAL using SQLite's online backup API, so the copy is
+# consistent and never runs inside a request. Every gunicorn worker has its own
+# backup thread, so they coordinate through a lock file and the snapshot
+# timestamps: a worker skips its snapshot when another worker's snapshot already
+# contains its writes, or defers it when one was taken less than an interval ago.
+_backup_dirty = threading.Event()
+_dirty_lock = threading.Lock()
+_dirty_since = None  # time of the oldest write not yet in a snapshot
+
+def backup_db(since=None):
+    global _dirty_since
+    since = since or datetime.now()
+    with _dirty_lock:
+        if _dirty_since is None or since < _dirty_since:
+            _dirty_since = since
+        _backup_dirty.set()
+    ensure_worker("backup-worker", _backup_loop)
+
+def _take_dirty():
+    global _dirty_since
+    with _dirty_lock:
+        since, _dirty_since = _dirty_since, None
+        _backup_dirty.clear()
+    return since
+
+@contextmanager
+def backup_lock():
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    with open(os.path.join(BACKUP_DIR, ".lock"), "w") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+def snapshot_if_needed(since, min_age=BACKUP_INTERVAL):
+    """Snapshot unless a newer one already holds writes made since `since`.
+    Returns False when the snapshot must be retried later."""
+    with backup_lock():
+        backups = list_backups()
+        newest = backups[0][0] if backups else None
+        # Names have second precision, so only a strictly later one is safe
+        if newest and newest > since:
+            return True
+        if newest and datetime.now() - newest < timedelta(seconds=min_age):
+            return False
+        snapshot_db()
+        prune_backups()
+        return True
+
+def _backup_loop():
+    while True:
+        _backup_dirty.wait()
+        # Debounce: every insert during the interval is covered by one snapshot
+        time.sleep(BACKUP_INTERVAL)
+        since = _take_dirty()
+        if since is None:
+            continue
+        try:
+            if not snapshot_if_needed(since):
+                backup_db(since)
+        except Exception as e:
+            app.logger.error("backup failed: %s", e)
+            backup_db(since)
+
+def snapshot_db():
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    path = os.path.join(BACKUP_DIR, f"data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    src = sqlite3.connect(DB_FILE)
+    dst = sqlite3.connect(tmp)
+    try:
+        src.backup(dst)
+        # Make the snapshot a standalone single file
+        dst.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dst.close()
+        src.close()
+    os.replace(tmp, path)
+    return path
+
+def _backup_time(filename):
+    stamp = filename[len("data_"):-len(".db")]
+    for fmt in ("%Y%m%d_%H%M%S", "%Y%m%d_%H%M"):
+        try:
+            return datetime.strptime(stamp, fmt)
+        except ValueError:
+            pass
+    return None
+
+def list_backups():
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    found = []
+    for f in os.listdir(BACKUP_DIR):
+        if f.startswith("data_") and f.endswith(".db"):
+            ts = _backup_time(f)
+            if ts:
+                found.append((ts, os.path.join(BACKUP_DIR, f)))
+    return sorted(found, reverse=True)
+
+def prune_backups(now=None):
+    now = now or datetime.now()
+    keep = set()
+    rules = [
+        (lambda ts: ts.strftime("%Y%m%d%H"), timedelta(hours=BACKUP_KEEP_HOURLY)),
+        (lambda ts: ts.strftime("%Y%m%d"), timedelta(days=BACKUP_KEEP_DAILY)),
+        (lambda ts: ts.strftime("%G%V"), timedelta(weeks=BACKUP_KEEP_WEEKLY)),
+    ]
+    backups = list_backups()
+    for bucket, window in rules:
+        seen = set()
+        for ts, path in backups:  # newest first, so the first per bucket wins
+            if now - ts <= window and bucket(ts) not in seen:
+                seen.add(bucket(ts))
+                keep.add(path)
+    if backups:
+        keep.add(backups[0][1])
+    for ts, path in backups:
+        if path not in keep:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # already pruned by another process
+
+def restore_db(path):
+    src = sqlite3.connect(path)
+    dst = sqlite3.connect(DB_FILE)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+    # Snapshots from older releases predate later migrations
+    init_db()
+
+@atexit.register
+def _final_backup():
+    since = _take_dirty()
+    if since is not None:
+        try:
+            snapshot_if_needed(since, min_age=0)
+        except Exception:
+            pass
+
+@app.cli.command("backup")
+def backup_command():
+    """Take a snapshot now and apply the retention policy."""
+    with backup_lock():
+        click.echo(snapshot_db())
+        prune_backups()
+
+@app.cli.command("restore")
+@click.argument("snapshot", required=False)
+def restore_command(snapshot):
+    """Restore data.db from SNAPSHOT (default: newest backup)."""
+    if not snapshot:
+        backups = list_backups()
+        if not backups:
+            raise click.ClickException("no backups found")
+        snapshot = backups[0][1]
+    restore_db(snapshot)
+    click.echo(f"restored {DB_FILE} from {snapshot}")
+    click.echo("restart the app workers: their caches still hold the old data")
 
 # ---------------- LICENSE ----------------
+# Validation results are cached per process for LICENSE_CACHE_TTL seconds.
+# /admin/add and /admin/remove invalidate this worker's entry immediately;
+# other gunicorn workers pick the change up when their entry expires.
+_license_cache = {}  # code -> (active, expires_at)
+
 def check_license(code):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM licenses WHERE license=? AND status='active'", (code,))
-    res = cur.fetchone()
-    conn.close()
-    return res is not None
+    now = time.monotonic()
+    hit = _license_cache.get(code)
+    if hit and hit[1] > now:
+        return hit[0]
+    active = get_db().execute("SELECT 1 FROM licenses WHERE license=? AND status='active'", (code,)).fetchone() is not None
+    if len(_license_cache) >= LICENSE_CACHE_MAX:
+        _license_cache.clear()
+    _license_cache[code] = (active, now + LICENSE_CACHE_TTL)
+    return active
+
+def invalidate_license(code=None):
+    if code is None:
+        _license_cache.clear()
+    else:
+        _license_cache.pop(code, None)
+
+# last_login/last_ip are buffered and written in one batch every
+# LOGIN_FLUSH_INTERVAL seconds, so logins do not take the write lock.
+_pending_logins = {}  # code -> (last_login, last_ip, code)
+_pending_lock = threading.Lock()
 
 def update_last_login(code, ip=None):
+    with _pending_lock:
+        _pending_logins[code] = (datetime.now().strftime("%Y-%m-%d %H:%M"), ip or "", code)
+    ensure_worker("login-flusher", _login_flush_loop)
+
+def _login_flush_loop():
+    while True:
+        time.sleep(LOGIN_FLUSH_INTERVAL)
+        try:
+            flush_logins()
+        except Exception as e:
+            app.logger.error("last_login flush failed: %s", e)
+
+@retry_on_busy
+def flush_logins():
+    with _pending_lock:
+        batch = list(_pending_logins.values())
+        _pending_logins.clear()
+    if not batch:
+        return
     conn = get_db()
-    conn.execute("UPDATE licenses SET last_login=?, last_ip=? WHERE license=?",
-                 (datetime.now().strftime("%Y-%m-%d %H:%M"), ip or "", code))
+    try:
+        conn.executemany("UPDATE licenses SET last_login=?, last_ip=? WHERE license=?", batch)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        # Requeue, unless a newer login for the same code arrived meanwhile
+        with _pending_lock:
+            for row in batch:
+                _pending_logins.setdefault(row[2], row)
+        raise
+
+atexit.register(flush_logins)
+
+@retry_on_busy
+def save_license(code, name):
+    conn = get_db()
+    conn.execute("INSERT OR REPLACE INTO licenses (license,name,status,last_login,last_ip) VALUES (?,?,?,?,?)",
+                 (code, name, "active", "", ""))
+    conn.commit()
+
+@retry_on_busy
+def delete_license(code):
+    conn = get_db()
+    conn.execute("DELETE FROM licenses WHERE license=?", (code,))
     conn.commit()
-    conn.close()
 
 # ---------------- DEMO LICENSE ----------------
 def demo_license():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM licenses WHERE license='DEMO123'")
-    if not cur.fetchone():
-        conn.execute("INSERT INTO licenses VALUES (?,?,?,?,?)", ("DEMO123","Demo Tailor","active","",""))
+    with closing(connect_db()) as conn:
+        # Workers released together by migration_lock() may all get here at once
+        conn.execute("INSERT OR IGNORE INTO licenses VALUES (?,?,?,?,?)", ("DEMO123","Demo Tailor","active","",""))
         conn.commit()
-    conn.close()
 
 demo_license()
 
+# ---------------- PAGE CACHE ----------------
+# Pages that do not vary per user are rendered once at startup and kept as
+# bytes, precompressed, with an ETag so repeat loads can be answered with 304.
+PAGES_MODIFIED = datetime.fromtimestamp(int(os.path.getmtime(__file__)))
+
+def cache_page(body, mimetype="text/html", last_modified=PAGES_MODIFIED):
+    if isinstance(body, str):
+        body = body.encode()
+    page = {
+        "mimetype": mimetype,
+        "etag": hashlib.sha1(body).hexdigest(),
+        "last_modified": last_modified,
+        "identity": body,
+        "gzip": gzip.compress(body, 9),
+    }
+    if brotli:
+        page["br"] = brotli.compress(body)
+    return page
+
+def serve_cached(page, cache_control="no-cache"):
+    encodings = [e for e in ("br", "gzip") if e in page] + ["identity"]
+    encoding = request.accept_encodings.best_match(encodings, default="identity")
+    resp = Response(page[encoding], mimetype=page["mimetype"])
+    if encoding != "identity":
+        resp.headers["Content-Encoding"] = encoding
+    resp.set_etag(page["etag"] if encoding == "identity" else f"{page['etag']}-{encoding}")
+    resp.last_modified = page["last_modified"]
+    resp.vary.add("Accept-Encoding")
+    resp.headers["Cache-Control"] = cache_control
+    return resp.make_conditional(request)
+
+def cache_static(filename):
+    path = os.path.join(app.static_folder, filename)
+    with open(path, "rb") as f:
+        body = f.read()
+    mimetype = "text/css" if filename.endswith(".css") else "application/octet-stream"
+    return cache_page(body, mimetype, datetime.fromtimestamp(int(os.path.getmtime(path))))
+
+STYLE_CSS = cache_static("style.css")
+
+@app.route("/static/style.css")
+def style_css():
+    return serve_cached(STYLE_CSS, "public, max-age=86400")
+
 # ---------------- LOGIN ----------------
-@app.route("/", methods=["GET","POST"])
-def login():
-    if request.method=="POST":
-        code = request.form.get("license")
-        if check_license(code):
-            session["license"] = code
-            update_last_login(code, request.remote_addr)
-            return redirect("/dashboard")
-        return "<h3 style='color:red'>❌ Invalid or Blocked License</h3>"
-    return render_template_string("""
+LOGIN_TEMPLATE = app.jinja_env.from_string("""
     <html>
     <head>
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
@@ -118,13 +864,21 @@ def login():
     </body>
     </html>
     """)
+LOGIN_PAGE = cache_page(LOGIN_TEMPLATE.render())
+
+@app.route("/", methods=["GET","POST"])
+def login():
+    if request.method=="POST":
+        code = request.form.get("license")
+        if check_license(code):
+            session["license"] = code
+            update_last_login(code, request.remote_addr)
+            return redirect("/dashboard")
+        return "<h3 style='color:red'>❌ Invalid or Blocked License</h3>"
+    return serve_cached(LOGIN_PAGE)
 
 # ---------------- DASHBOARD ----------------
-@app.route("/dashboard")
-def dashboard():
-    if "license" not in session:
-        return redirect("/")
-    return render_template_string("""
+DASHBOARD_TEMPLATE = app.jinja_env.from_string("""
     <html>
     <head>
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
@@ -158,64 +912,206 @@ def dashboard():
         <br>
         <a href="/view" style="display:inline-block;padding:10px;background:#2196F3;color:white;border-radius:5px;text-decoration:none;">View All Customers</a>
         <a href="/search" style="display:inline-block;padding:10px;background:#FF9800;color:white;border-radius:5px;text-decoration:none;">Search</a>
+        <a href="/reports" style="display:inline-block;padding:10px;background:#9C27B0;color:white;border-radius:5px;text-decoration:none;">Reports</a>
+        <a href="/import" style="display:inline-block;padding:10px;background:#607D8B;color:white;border-radius:5px;text-decoration:none;">Import / Export</a>
         <a href="/logout" style="display:inline-block;padding:10px;background:#f44336;color:white;border-radius:5px;text-decoration:none;">Logout</a>
         </div>
     </body>
     </html>
     """)
+DASHBOARD_PAGE = cache_page(DASHBOARD_TEMPLATE.render())
 
-# ---------------- ADD CUSTOMER ----------------
-@app.route("/add", methods=["POST"])
-def add():
+@app.route("/dashboard")
+def dashboard():
     if "license" not in session:
         return redirect("/")
+    return serve_cached(DASHBOARD_PAGE, "private, no-cache")
+
+# ---------------- ADD CUSTOMER ----------------
+CUSTOMER_FIELDS = ["name", "mobile", "length", "chest", "waist", "shalwar_length", "cuff", "side", "packet",
+                   "shalwar_packet", "zip", "ghara", "slai", "button_style", "poncha", "collar", "amount"]
+
+def customer_row(lic, data, created_at=None):
+    values = [numeric(data.get(f)) if f in NUMERIC_COLUMNS else data.get(f) for f in CUSTOMER_FIELDS]
+    return (lic, *values, created_at or datetime.now().strftime("%Y-%m-%d %H:%M"), digits(data.get("mobile")))
+
+def non_finite_field(data):
+    """First measurement or amount that reads as inf or nan. numeric() keeps
+    those as text, but "1e999" would still overflow to inf through the
+    column's REAL affinity, so such rows are refused."""
+    for f in NUMERIC_COLUMNS:
+        number = parse_number(data.get(f))
+        if number is not None and not math.isfinite(number):
+            return f
+    return None
+
+@retry_on_busy
+def insert_customers(rows):
     conn = get_db()
-    conn.execute("""
+    conn.executemany(f"""
     INSERT INTO customers
-    (name,mobile,length,chest,waist,shalwar_length,cuff,side,packet,shalwar_packet,zip,ghara,slai,button_style,poncha,collar,amount,created_at)
-    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-    """, (
-        request.form["name"], request.form["mobile"], request.form.get("length"), request.form.get("chest"),
-        request.form.get("waist"), request.form.get("shalwar_length"), request.form.get("cuff"),
-        request.form.get("side"), request.form.get("packet"), request.form.get("shalwar_packet"),
-        request.form.get("zip"), request.form.get("ghara"), request.form.get("slai"),
-        request.form.get("button_style"), request.form.get("poncha"), request.form.get("collar"),
-        request.form.get("amount"), datetime.now().strftime("%Y-%m-%d %H:%M")
-    ))
+    (license,{",".join(CUSTOMER_FIELDS)},created_at,mobile_digits)
+    VALUES ({",".join("?" * (len(CUSTOMER_FIELDS) + 3))})
+    """, rows)
     conn.commit()
-    conn.close()
+
+# One writer thread per process owns customer inserts. Requests enqueue their
+# row and block until the batch containing it has been committed, so every
+# acknowledged row is durable while many rows share a single fsync.
+_write_queue = queue.Queue()
+
+def insert_customer(row):
+    done = Future()
+    start = time.perf_counter()
+    _write_queue.put((row, done))
+    ensure_worker("customer-writer", _writer_loop)
+    try:
+        queries, seconds = done.result(timeout=WRITE_ACK_TIMEOUT)
+    finally:
+        observe("smarttailor_write_ack_wait_seconds", time.perf_counter() - start)
+    # The SQL ran on the writer thread; count it in this request's stats
+    _request_stats.queries = getattr(_request_stats, "queries", 0) + queries
+    _request_stats.seconds = getattr(_request_stats, "seconds", 0.0) + seconds
+
+def _writer_loop():
+    # Pay for a full fsync per batch; the batch is what makes it cheap
+    get_db().execute("PRAGMA synchronous=FULL")
+    while True:
+        batch = [_write_queue.get()]
+        # A lone row is committed at once; only when others are already queued
+        # is it worth waiting up to WRITE_BATCH_WINDOW for more to join
+        deadline = time.monotonic() + WRITE_BATCH_WINDOW if not _write_queue.empty() else 0
+        while len(batch) < WRITE_BATCH_MAX:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(_write_queue.get(timeout=remaining) if remaining > 0 else _write_queue.get_nowait())
+            except queue.Empty:
+                break
+        observe("smarttailor_write_batch_rows", len(batch), BATCH_SIZE_BUCKETS)
+        _request_stats.queries = 0
+        _request_stats.seconds = 0.0
+        try:
+            insert_customers([row for row, _ in batch])
+        except Exception as e:
+            get_db().rollback()
+            for _, done in batch:
+                done.set_exception(e)
+        else:
+            for _, done in batch:
+                done.set_result((_request_stats.queries, _request_stats.seconds))
+
+@app.route("/add", methods=["POST"])
+def add():
+    if "license" not in session:
+        return redirect("/")
+    if not request.form.get("name") or not request.form.get("mobile"):
+        return "<h3 style='color:red'>❌ Name and Mobile are required</h3>", 400
+    field = non_finite_field(request.form)
+    if field:
+        return f"<h3 style='color:red'>❌ {field} must be a number</h3>", 400
+    insert_customer(customer_row(session["license"], request.form))
     backup_db()
     return redirect("/dashboard")
 
 # ---------------- VIEW CUSTOMERS ----------------
+HIDDEN_COLUMNS = {"license", "mobile_digits"}
+
+def render_customer(r):
+    return f"<pre>{ {k: r[k] for k in r.keys() if k not in HIDDEN_COLUMNS} }</pre><hr>"
+
+# Keyset pagination: ?before=<id> pages to older rows, ?after=<id> to newer
+# ones, so each page is one range scan of the shop's (license, id) index.
 @app.route("/view")
 def view_customers():
     if "license" not in session:
         return redirect("/")
+    if request.args.get("all"):
+        return Response(stream_with_context(stream_customers(session["license"])), mimetype="text/html")
+    limit = max(1, min(request.args.get("limit", VIEW_PAGE_SIZE, type=int), VIEW_MAX_PAGE_SIZE))
+    before = request.args.get("before", type=int)
+    after = request.args.get("after", type=int)
+    lic = session["license"]
     conn = get_db()
-    rows = conn.execute("SELECT * FROM customers ORDER BY id DESC").fetchall()
-    conn.close()
-    html = "<h2>All Customers</h2>"
-    for r in rows:
-        html += f"<pre>{dict(r)}</pre><hr>"
-    html += '<a href="/dashboard">Back</a>'
-    return html
+    if after is not None:
+        rows = conn.execute("SELECT * FROM customers WHERE license=? AND id>? ORDER BY id ASC LIMIT ?",
+                            (lic, after, limit + 1)).fetchall()
+        has_newer = len(rows) > limit
+        rows = rows[:limit][::-1]
+        has_older = True
+    else:
+        if before is None:
+            rows = conn.execute("SELECT * FROM customers WHERE license=? ORDER BY id DESC LIMIT ?",
+                                (lic, limit + 1)).fetchall()
+        else:
+            rows = conn.execute("SELECT * FROM customers WHERE license=? AND id<? ORDER BY id DESC LIMIT ?",
+                                (lic, before, limit + 1)).fetchall()
+        has_older = len(rows) > limit
+        rows = rows[:limit]
+        has_newer = before is not None
+    size = f"&limit={limit}" if limit != VIEW_PAGE_SIZE else ""
+    html = ["<h2>All Customers</h2>"]
+    html.extend(render_customer(r) for r in rows)
+    if rows and has_newer:
+        html.append(f'<a href="/view?after={rows[0]["id"]}{size}">&laquo; Newer</a> ')
+    if rows and has_older:
+        html.append(f'<a href="/view?before={rows[-1]["id"]}{size}">Older &raquo;</a> ')
+    html.append('<a href="/view?all=1">Full list</a> <a href="/dashboard">Back</a>')
+    return "".join(html)
+
+def stream_customers(lic):
+    yield "<h2>All Customers</h2>"
+    cur = get_db().execute("SELECT * FROM customers WHERE license=? ORDER BY id DESC", (lic,))
+    while True:
+        rows = cur.fetchmany(STREAM_CHUNK)
+        if not rows:
+            break
+        yield "".join(render_customer(r) for r in rows)
+    yield '<a href="/dashboard">Back</a>'
 
 # ---------------- SEARCH ----------------
+# Trigram FTS5 index over name and normalized mobile digits. Queries shorter
+# than a trigram fall back to prefix matches on the shop's (license, name) and
+# (license, mobile_digits) indexes; LIKE only uses the index without wildcards
+# in the pattern, so % and _ are dropped from the query.
+def find_customers(lic, q, limit=SEARCH_LIMIT):
+    q = q.strip()
+    d = digits(q)
+    conn = get_db()
+    terms = []
+    if len(q) >= 3:
+        terms.append('name:"%s"' % q.replace('"', '""'))
+    if len(d) >= 3:
+        terms.append(f'mobile_digits:"{d}"')
+    if terms:
+        return conn.execute("""
+        SELECT c.* FROM customers_fts JOIN customers c ON c.id=customers_fts.rowid
+        WHERE customers_fts MATCH ? AND c.license=? ORDER BY customers_fts.rank LIMIT ?
+        """, (" OR ".join(terms), lic, limit)).fetchall()
+    q = q.replace("%", "").replace("_", "")
+    if not q:
+        return []
+    if d:
+        # Written as a UNION so each branch gets its own index range scan
+        return conn.execute("""
+        SELECT * FROM customers WHERE id IN (
+            SELECT id FROM customers WHERE license=? AND name LIKE ?
+            UNION ALL SELECT id FROM customers WHERE license=? AND mobile_digits GLOB ?
+        ) ORDER BY id DESC LIMIT ?
+        """, (lic, f"{q}%", lic, f"{d}*", limit)).fetchall()
+    return conn.execute("SELECT * FROM customers WHERE license=? AND name LIKE ? ORDER BY id DESC LIMIT ?",
+                        (lic, f"{q}%", limit)).fetchall()
+
 @app.route("/search", methods=["GET","POST"])
 def search_customers():
     if "license" not in session:
         return redirect("/")
     if request.method=="POST":
         q = request.form.get("query","")
-        conn = get_db()
-        rows = conn.execute("SELECT * FROM customers WHERE name LIKE ? OR mobile LIKE ?",(f"%{q}%","%{q}%")).fetchall()
-        conn.close()
-        html = f"<h2>Search results for '{q}'</h2>"
-        for r in rows:
-            html += f"<pre>{dict(r)}</pre><hr>"
-        html += '<a href="/dashboard">Back</a>'
-        return html
+        rows = find_customers(session["license"], q)
+        html = [f"<h2>Search results for '{q}'</h2>"]
+        html.extend(render_customer(r) for r in rows)
+        html.append('<a href="/dashboard">Back</a>')
+        return "".join(html)
     return """
     <form method="post">
         Name or Mobile: <input name="query" required>
@@ -223,6 +1119,190 @@ def search_customers():
     </form>
     """
 
+# ---------------- REPORTS ----------------
+# Served from the rollup tables: cost is bounded by the number of days/months
+# requested, not by how many orders the shop has.
+@app.route("/reports")
+def reports():
+    if "license" not in session:
+        return redirect("/")
+    lic = session["license"]
+    days = max(1, min(request.args.get("days", 30, type=int), 366))
+    months = max(1, min(request.args.get("months", 12, type=int), 120))
+    now = datetime.now()
+    since = (now - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    conn = get_db()
+    daily = conn.execute("SELECT day, orders, revenue FROM daily_rollups WHERE license=? AND day>=? ORDER BY day",
+                         (lic, since)).fetchall()
+    monthly = conn.execute("SELECT month, orders, revenue FROM monthly_rollups WHERE license=? ORDER BY month DESC LIMIT ?",
+                           (lic, months)).fetchall()
+    today = next((r for r in daily if r["day"] == now.strftime("%Y-%m-%d")), None)
+    month = next((r for r in monthly if r["month"] == now.strftime("%Y-%m")), None)
+    return jsonify(
+        today={"orders": today["orders"] if today else 0, "revenue": today["revenue"] if today else 0},
+        month={"orders": month["orders"] if month else 0, "revenue": month["revenue"] if month else 0},
+        daily=[dict(r) for r in daily],
+        monthly=[dict(r) for r in reversed(monthly)],
+    )
+
+# ---------------- IMPORT / EXPORT ----------------
+# Files are read and written a row at a time; inserts go in IMPORT_CHUNK-row
+# transactions with executemany, and exports fetch STREAM_CHUNK rows at a time.
+EXPORT_COLUMNS = ["id", *CUSTOMER_FIELDS, "created_at"]
+
+def read_records(stream, fmt):
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "jsonl":
+        for line in text:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+    else:
+        yield from csv.DictReader(text)
+
+# Only unambiguous ISO dates are accepted: 08/01/2026 could be either order,
+# and rollups and date ordering rely on created_at being "%Y-%m-%d %H:%M"
+CREATED_AT_FORMATS = ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d")
+
+def parse_created_at(value):
+    for fmt in CREATED_AT_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt).strftime("%Y-%m-%d %H:%M")
+        except ValueError:
+            pass
+    return None
+
+def import_customers(lic, records):
+    """Returns (imported, rejected, error). error is set when the file could
+    not be read to the end; the rows before it are imported all the same."""
+    imported, rejected, chunk, error, line = 0, [], [], None, 0
+    try:
+        for line, rec in enumerate(records, 1):
+            if not isinstance(rec, dict) or not rec.get("name") or not rec.get("mobile"):
+                rejected.append(line)
+                continue
+            data = {k: None if v is None else str(v) for k, v in rec.items()}
+            if non_finite_field(data):
+                rejected.append(line)
+                continue
+            created_at = None
+            if data.get("created_at"):
+                created_at = parse_created_at(data["created_at"])
+                if created_at is None:
+                    rejected.append(line)
+                    continue
+            chunk.append(customer_row(lic, data, created_at))
+            if len(chunk) >= IMPORT_CHUNK:
+                insert_customers(chunk)
+                imported += len(chunk)
+                chunk = []
+    except UnicodeDecodeError:
+        # Decoding runs ahead in blocks, so the record number is approximate
+        error = f"the file is not UTF-8 text (near record {line + 1}); save it as \"CSV UTF-8\""
+    except csv.Error as e:
+        error = f"record {line + 1} could not be read: {e}"
+    if chunk:
+        insert_customers(chunk)
+        imported += len(chunk)
+    if imported:
+        backup_db()
+    return imported, rejected, error
+
+def export_customers(lic, fmt):
+    cur = get_db().execute(f"SELECT {','.join(EXPORT_COLUMNS)} FROM customers WHERE license=? ORDER BY id", (lic,))
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if fmt == "csv":
+        writer.writerow(EXPORT_COLUMNS)
+    while True:
+        rows = cur.fetchmany(STREAM_CHUNK)
+        if not rows:
+            break
+        if fmt == "jsonl":
+            yield "".join(json.dumps(dict(r)) + "\n" for r in rows)
+        else:
+            writer.writerows(rows)
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if fmt == "csv" and buf.tell():
+        yield buf.getvalue()
+
+def file_format(filename, fmt=None):
+    fmt = fmt or ("jsonl" if filename and filename.lower().endswith((".jsonl", ".json")) else "csv")
+    if fmt not in ("csv", "jsonl"):
+        raise ValueError(f"unsupported format: {fmt}")
+    return fmt
+
+@app.route("/import", methods=["GET","POST"])
+def import_view():
+    if "license" not in session:
+        return redirect("/")
+    if request.method=="POST":
+        upload = request.files.get("file")
+        if not upload:
+            return "<h3 style='color:red'>❌ No file uploaded</h3>", 400
+        try:
+            fmt = file_format(upload.filename, request.form.get("format") or None)
+        except ValueError:
+            return "<h3 style='color:red'>❌ Unsupported format, use csv or jsonl</h3>", 400
+        imported, rejected, error = import_customers(session["license"], read_records(upload.stream, fmt))
+        html = f"<h2>Imported {imported} customers</h2>"
+        if error:
+            html = f"<h3 style='color:red'>❌ Import stopped: {error}</h3><p>Imported {imported} customers before that.</p>"
+        if rejected:
+            html += f"<p>Skipped {len(rejected)} rows without name/mobile, with a created_at that is not YYYY-MM-DD [HH:MM] or with an infinite number (record numbers): {rejected[:IMPORT_MAX_ERRORS]}</p>"
+        html += '<a href="/dashboard">Back</a>'
+        return html, 400 if error else 200
+    return """
+    <h3>Import customers (CSV with a header row, or JSON lines)</h3>
+    <form method="post" enctype="multipart/form-data">
+        <input type="file" name="file" required>
+        <select name="format"><option value="">Detect</option><option>csv</option><option>jsonl</option></select>
+        <button>Import</button>
+    </form>
+    <p>Export: <a href="/export?format=csv">CSV</a> | <a href="/export?format=jsonl">JSON lines</a></p>
+    <a href="/dashboard">Back</a>
+    """
+
+@app.route("/export")
+def export_view():
+    if "license" not in session:
+        return redirect("/")
+    fmt = request.args.get("format", "csv")
+    if fmt not in ("csv", "jsonl"):
+        return "<h3 style='color:red'>❌ Unsupported format</h3>", 400
+    resp = Response(stream_with_context(export_customers(session["license"], fmt)),
+                    mimetype="text/csv" if fmt == "csv" else "application/x-ndjson")
+    resp.headers["Content-Disposition"] = f"attachment; filename=customers.{fmt}"
+    return resp
+
+@app.cli.command("import-customers")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--license", "lic", required=True, help="License the customers belong to.")
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), help="Default: from the file extension.")
+def import_command(path, lic, fmt):
+    """Bulk-load customers from a CSV or JSON-lines file."""
+    with open(path, "rb") as f:
+        imported, rejected, error = import_customers(lic, read_records(f, file_format(path, fmt)))
+    click.echo(f"imported {imported} customers, skipped {len(rejected)}")
+    if rejected:
+        click.echo(f"skipped records: {rejected[:IMPORT_MAX_ERRORS]}")
+    if error:
+        raise click.ClickException(f"import stopped: {error}")
+
+@app.cli.command("export-customers")
+@click.option("--license", "lic", required=True, help="License whose customers are exported.")
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), default="csv")
+@click.option("-o", "--output", type=click.File("w"), default="-")
+def export_command(lic, fmt, output):
+    """Stream a license's customers to a CSV or JSON-lines file."""
+    for chunk in export_customers(lic, fmt):
+        output.write(chunk)
+
 # ---------------- LOGOUT ----------------
 @app.route("/logout")
 def logout():
@@ -247,10 +1327,12 @@ def admin_login():
 def admin():
     if not session.get("admin"):
         return redirect("/admin-login")
-    conn = get_db()
-    licenses = conn.execute("SELECT * FROM licenses").fetchall()
-    conn.close()
+    flush_logins()
+    licenses = get_db().execute("SELECT * FROM licenses").fetchall()
+    unassigned = get_db().execute("SELECT count(*) FROM customers WHERE license IS NULL").fetchone()[0]
     html = "<h2>Admin Dashboard</h2>"
+    if unassigned:
+        html += f"<p>{unassigned} customers from before per-shop storage have no license yet; assign them with <code>flask assign-customers LICENSE</code>.</p>"
     html += "<table border=1 style='border-collapse:collapse'><tr><th>License</th><th>Name</th><th>Status</th><th>Last Login</th><th>Actions</th></tr>"
     for l in licenses:
         html += f"<tr><td>{l['license']}</td><td>{l['name']}</td><td>{l['status']}</td><td>{l['last_login']}</td>"
@@ -270,22 +1352,32 @@ def admin():
 def admin_add():
     if not session.get("admin"):
         return redirect("/admin-login")
-    conn = get_db()
-    conn.execute("INSERT OR REPLACE INTO licenses (license,name,status,last_login,last_ip) VALUES (?,?,?,?,?)",
-                 (request.form["license"], request.form["name"], "active","",""))
-    conn.commit()
-    conn.close()
+    save_license(request.form["license"], request.form["name"])
+    invalidate_license(request.form["license"])
     return redirect("/admin")
 
 @app.route("/admin/remove/<code>")
 def admin_remove(code):
     if not session.get("admin"):
         return redirect("/admin-login")
+    delete_license(code)
+    invalidate_license(code)
+    return redirect("/admin")
+
+@retry_on_busy
+def assign_customers(code):
     conn = get_db()
-    conn.execute("DELETE FROM licenses WHERE license=?", (code,))
+    count = conn.execute("UPDATE customers SET license=? WHERE license IS NULL", (code,)).rowcount
     conn.commit()
-    conn.close()
-    return redirect("/admin")
+    return count
+
+@app.cli.command("assign-customers")
+@click.argument("license")
+def assign_customers_command(license):
+    """Give customers that have no license yet to LICENSE."""
+    if not get_db().execute("SELECT 1 FROM licenses WHERE license=?", (license,)).fetchone():
+        raise click.ClickException(f"unknown license: {license}")
+    click.echo(f"assigned {assign_customers(license)} customers to {license}")
 
 # ---------------- RUN ----------------
 if __name__=="__main__":
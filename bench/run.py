@@ -0,0 +1,229 @@
+"""Load-test benchmark for Smart Tailor.
+
+Seeds a synthetic database, starts gunicorn on it and measures throughput and
+latency of login, /add, /view and /search. Run from the repository root:
+
+    python bench/run.py                                # 100k customers, 4 workers
+    python bench/run.py --save bench/baseline.json     # record a baseline
+    python bench/run.py --baseline bench/baseline.json # fail on regressions
+
+Pass --url to benchmark a server that is already running; it is not seeded and
+must already have an active BENCH license.
+"""
+import argparse, http.client, json, os, random, socket, sqlite3, subprocess, sys, tempfile, threading, time
+from urllib.parse import urlencode, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LICENSE = "BENCH"
+FIRST = ["Ali", "Usman", "Bilal", "Hamza", "Ahmed", "Zain", "Saad", "Imran", "Tariq", "Fahad", "Asad", "Kashif"]
+LAST = ["Khan", "Sattar", "Raza", "Iqbal", "Malik", "Butt", "Qureshi", "Sheikh", "Chaudhry", "Abbasi"]
+
+def synthetic_customer(rnd):
+    return {
+        "name": f"{rnd.choice(FIRST)} {rnd.choice(LAST)}",
+        "mobile": f"03{rnd.randint(0, 49):02d}-{rnd.randint(0, 9999999):07d}",
+        "length": str(rnd.randint(38, 46)), "chest": str(rnd.randint(34, 48)), "waist": str(rnd.randint(28, 44)),
+        "shalwar_length": str(rnd.randint(36, 42)), "cuff": str(rnd.randint(8, 11)),
+        "slai": rnd.choice(["Single", "Double"]), "button_style": rnd.choice(["Fancy", "Simple"]),
+        "amount": str(rnd.choice([1200, 1500, 1800, 2500, 3000])),
+    }
+
+def bench_env(workdir):
+    return dict(os.environ, DB_FILE=os.path.join(workdir, "data.db"), BACKUP_DIR=os.path.join(workdir, "backup"))
+
+def seed(workdir, customers):
+    """Create the database through the app's own bulk-import command."""
+    path = os.path.join(workdir, "customers.jsonl")
+    rnd = random.Random(42)
+    with open(path, "w") as f:
+        for _ in range(customers):
+            f.write(json.dumps(synthetic_customer(rnd)) + "\n")
+    subprocess.run([sys.executable, "-m", "flask", "--app", "app", "import-customers", path, "--license", LICENSE],
+                   cwd=ROOT, env=bench_env(workdir), check=True)
+    conn = sqlite3.connect(os.path.join(workdir, "data.db"))
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO licenses VALUES (?,?,?,?,?)", (LICENSE, "Benchmark Tailor", "active", "", ""))
+    conn.close()
+
+def start_gunicorn(workdir, port, workers, threads):
+    # gunicorn.conf.py selects gthread workers; --threads 0 benchmarks sync ones
+    mode = ["--threads", str(threads)] if threads else ["-k", "sync", "--threads", "1"]
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-w", str(workers), *mode, "-b", f"127.0.0.1:{port}",
+                             "--log-level", "warning", "app:app"], cwd=ROOT, env=bench_env(workdir))
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit("gunicorn did not start")
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class Client:
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.cookie = None
+        self.location = None
+
+    def request(self, method, path, form=None):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        headers = {"Cookie": self.cookie} if self.cookie else {}
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        try:
+            conn.request(method, path, body, headers)
+            resp = conn.getresponse()
+            resp.read()
+            self.location = resp.getheader("Location")
+            cookie = resp.getheader("Set-Cookie")
+            if cookie:
+                self.cookie = cookie.split(";", 1)[0]
+            return resp.status
+        finally:
+            conn.close()
+
+    def redirected_to_dashboard(self, status):
+        # Without a valid session the app also answers 302, but to the login page
+        return status == 302 and (self.location or "").endswith("/dashboard")
+
+    def login(self):
+        return self.redirected_to_dashboard(self.request("POST", "/", {"license": LICENSE}))
+
+SCENARIOS = {
+    "login": lambda c, rnd: c.login(),
+    "add": lambda c, rnd: c.redirected_to_dashboard(c.request("POST", "/add", synthetic_customer(rnd))),
+    "view": lambda c, rnd: c.request("GET", "/view") == 200,
+    "search": lambda c, rnd: c.request("POST", "/search", {"query": rnd.choice([
+        rnd.choice(FIRST), rnd.choice(LAST), f"{rnd.randint(0, 9999):04d}"])}) == 200,
+}
+
+def run_scenario(url, name, concurrency, duration):
+    latencies, errors, no_session = [], [0], []
+    lock = threading.Lock()
+    stop = time.monotonic() + duration
+
+    def worker(n):
+        rnd = random.Random(n)
+        client = Client(url)
+        if not client.login():
+            no_session.append(n)
+            return
+        mine, failed = [], 0
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            try:
+                ok = SCENARIOS[name](client, rnd)
+            except OSError:
+                ok = False
+            mine.append(time.perf_counter() - start)
+            failed += not ok
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if no_session:
+        raise SystemExit(f"login as {LICENSE} failed; is the license active on the server?")
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+    return {"requests": len(latencies), "errors": errors[0], "rps": len(latencies) / duration,
+            "p50_ms": pct(0.50), "p99_ms": pct(0.99)}
+
+def batch_stats(url, workers):
+    """Mean rows per /add commit, summed over every gunicorn worker.
+
+    Each /metrics scrape is answered by one worker, so scrape until every
+    worker (told apart by smarttailor_process_pid) has been seen."""
+    client, seen = Client(url), {}
+    for _ in range(workers * 20):
+        conn = http.client.HTTPConnection(client.host, client.port, timeout=30)
+        conn.request("GET", "/metrics")
+        values = dict(line.rsplit(" ", 1) for line in conn.getresponse().read().decode().splitlines()
+                      if line and not line.startswith("#"))
+        conn.close()
+        seen[values["smarttailor_process_pid"]] = (float(values.get("smarttailor_write_batch_rows_sum{}", 0)),
+                                                   float(values.get("smarttailor_write_batch_rows_count{}", 0)))
+        if len(seen) >= workers:
+            break
+    rows = sum(r for r, _ in seen.values())
+    batches = sum(b for _, b in seen.values())
+    return rows / batches if batches else 0.0
+
+def compare(results, baseline, tolerance):
+    failures = []
+    for name, base in baseline.items():
+        cur = results.get(name)
+        if not cur:
+            continue
+        if cur["p99_ms"] > base["p99_ms"] * (1 + tolerance):
+            failures.append(f"{name}: p99 {cur['p99_ms']:.1f}ms vs baseline {base['p99_ms']:.1f}ms")
+        if cur["rps"] < base["rps"] * (1 - tolerance):
+            failures.append(f"{name}: {cur['rps']:.0f} req/s vs baseline {base['rps']:.0f} req/s")
+        if cur["errors"] > base["errors"]:
+            failures.append(f"{name}: {cur['errors']} errors vs baseline {base['errors']}")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=100000, help="synthetic customers to seed")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker (0: sync workers)")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads per scenario")
+    parser.add_argument("--duration", type=float, default=15, help="seconds per scenario")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset to run")
+    parser.add_argument("--url", help="benchmark an already running server instead")
+    parser.add_argument("--save", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results to compare against; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression vs baseline")
+    args = parser.parse_args()
+
+    proc = None
+    with tempfile.TemporaryDirectory() as workdir:
+        url = args.url
+        if not url:
+            start = time.monotonic()
+            seed(workdir, args.customers)
+            print(f"seeded in {time.monotonic() - start:.1f}s")
+            port = free_port()
+            proc = start_gunicorn(workdir, port, args.workers, args.threads)
+            url = f"http://127.0.0.1:{port}"
+        try:
+            results = {}
+            print(f"{'scenario':<8} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+            for name in args.scenarios.split(","):
+                r = results[name] = run_scenario(url, name, args.concurrency, args.duration)
+                print(f"{name:<8} {r['requests']:>9} {r['errors']:>7} {r['rps']:>9.1f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+            if "add" in results:
+                results["add"]["rows_per_batch"] = batch_stats(url, args.workers)
+                print(f"/add group commit: {results['add']['rows_per_batch']:.1f} rows per batch")
+        finally:
+            if proc:
+                proc.terminate()
+                proc.wait()
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = compare(results, json.load(f), args.tolerance)
+        for line in failures:
+            print("REGRESSION", line)
+        if failures:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
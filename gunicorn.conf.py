@@ -0,0 +1,15 @@
+# Picked up automatically by `gunicorn app:app` run from this directory.
+import os, subprocess, sys
+
+# /add group-commits rows from concurrent requests of the same process, which
+# needs threaded workers; sync workers serve one request at a time.
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+
+# Migrate once in the master before workers fork: a long migration inside a
+# booting worker would be killed by the worker timeout and retried forever.
+def on_starting(server):
+    subprocess.run([sys.executable, "-m", "flask", "--app", "app", "migrate"],
+                   cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+on_reload = on_starting
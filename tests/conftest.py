@@ -0,0 +1,7 @@
+import os, sys, tempfile
+
+# app.py opens DB_FILE at import; point it at a scratch directory first
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("DB_FILE", os.path.join(_tmp, "data.db"))
+os.environ.setdefault("BACKUP_DIR", os.path.join(_tmp, "backup"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,85 @@
+import sqlite3
+
+import pytest
+
+import app
+
+# customers as created by the first release, before any migration
+BASELINE_CUSTOMERS = """
+CREATE TABLE customers(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT, mobile TEXT, length TEXT, chest TEXT, waist TEXT, shalwar_length TEXT, cuff TEXT, side TEXT,
+    packet TEXT, shalwar_packet TEXT, zip TEXT, ghara TEXT, slai TEXT, button_style TEXT, poncha TEXT,
+    collar TEXT, amount TEXT, created_at TEXT
+)"""
+
+# customers as found in the oldest snapshots under backup/
+SNAPSHOT_CUSTOMERS = """
+CREATE TABLE customers(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT, mobile TEXT, length TEXT, chest TEXT, waist TEXT, shoulder TEXT, poncha TEXT, batton TEXT,
+    packet TEXT, zip TEXT, shalwar TEXT, collar TEXT, ghara TEXT, amount TEXT, created_at TEXT
+)"""
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "data.db")
+    monkeypatch.setattr(app, "DB_FILE", path)
+    monkeypatch.setattr(app, "LEGACY_LICENSE", "SHOP1")
+    return path
+
+def make_db(path, schema, rows):
+    conn = sqlite3.connect(path)
+    conn.execute(schema)
+    conn.execute("CREATE TABLE licenses(license TEXT PRIMARY KEY, name TEXT, status TEXT, last_login TEXT, last_ip TEXT)")
+    for row in rows:
+        conn.execute(f"INSERT INTO customers ({','.join(row)}) VALUES ({','.join('?' * len(row))})", list(row.values()))
+    conn.commit()
+    conn.close()
+
+def test_baseline_schema_migrates_through_every_step(db_file):
+    make_db(db_file, BASELINE_CUSTOMERS, [
+        {"name": "Ali Khan", "mobile": "0300-1234567", "length": "40", "amount": "1200", "created_at": "2026-01-05 10:00"},
+        {"name": "Usman Sattar", "mobile": "0301 7654321", "length": "40 1/2", "amount": "1,500", "created_at": "2026-01-05 12:00"},
+        {"name": "Bilal Raza", "mobile": "0302-1111111", "amount": "Rs 900", "created_at": "2026-01-20 09:00"},
+        {"name": "Hamza Iqbal", "mobile": "0303-2222222", "amount": "", "created_at": "2026-02-01 09:00"},
+        {"name": "Zain Malik", "mobile": "0304-3333333", "amount": "1e999", "created_at": "2026-02-02 09:00"},
+        {"name": "No Date", "mobile": "0305-4444444", "amount": "700"},
+    ])
+    app.init_db()
+
+    conn = sqlite3.connect(db_file)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(app.MIGRATIONS)
+    assert conn.execute("SELECT count(*) FROM customers WHERE license='SHOP1'").fetchone()[0] == 6
+    assert conn.execute("SELECT amount FROM customers WHERE name='Usman Sattar'").fetchone()[0] == 1500.0
+    assert conn.execute("SELECT length FROM customers WHERE name='Usman Sattar'").fetchone()[0] == "40 1/2"
+    assert conn.execute("SELECT mobile_digits FROM customers WHERE name='Ali Khan'").fetchone()[0] == "03001234567"
+
+    daily = conn.execute("SELECT day, orders, revenue FROM daily_rollups ORDER BY day").fetchall()
+    assert daily == [("2026-01-05", 2, 2700.0), ("2026-01-20", 1, 900.0),
+                     ("2026-02-01", 1, 0.0), ("2026-02-02", 1, 0.0)]
+    monthly = conn.execute("SELECT month, orders, revenue FROM monthly_rollups ORDER BY month").fetchall()
+    assert monthly == [("2026-01", 3, 3600.0), ("2026-02", 2, 0.0)]
+
+    assert conn.execute("SELECT count(*) FROM customers_fts").fetchone()[0] == 6
+    hits = conn.execute("SELECT rowid FROM customers_fts WHERE customers_fts MATCH 'mobile_digits:\"7654\"'").fetchall()
+    assert hits == conn.execute("SELECT id FROM customers WHERE name='Usman Sattar'").fetchall()
+
+    # Triggers keep the index and the rollups in step with later writes
+    conn.execute("INSERT INTO customers(license, name, mobile_digits, amount, created_at) "
+                 "VALUES ('SHOP1', 'Saad Butt', '03065555555', 300, '2026-02-02 18:00')")
+    assert conn.execute("SELECT orders, revenue FROM monthly_rollups WHERE month='2026-02'").fetchone() == (3, 300.0)
+    assert conn.execute("SELECT count(*) FROM customers_fts WHERE customers_fts MATCH '\"saad\"'").fetchone()[0] == 1
+    conn.close()
+
+def test_columns_from_old_snapshots_survive(db_file):
+    make_db(db_file, SNAPSHOT_CUSTOMERS, [
+        {"name": "M.Usman", "mobile": "03704614654", "length": "5", "shoulder": "23", "batton": "fancy",
+         "shalwar": "12", "amount": "1200", "created_at": "2026-01-08 21:29"},
+    ])
+    app.init_db()
+
+    conn = sqlite3.connect(db_file)
+    row = conn.execute("SELECT length, shoulder, batton, shalwar, amount FROM customers").fetchone()
+    assert row == (5.0, "23", "fancy", "12", 1200.0)
+    conn.close()